@@ -6,31 +6,64 @@ Main application file with routes for upload, analysis, and clearing results.
 from flask import Flask, render_template, request, redirect, url_for, session, send_file, send_from_directory
 import os
 import uuid
+import mimetypes
 from werkzeug.utils import secure_filename
 import pandas as pd
-import json
+import orjson
+import diskcache
 from io import BytesIO
 
-from backend.spectrograms import generate_all_spectrograms
+from backend.fft_backend import enable_pyfftw
+from backend.spectrograms import generate_all_spectrograms, SPECTROGRAM_TYPES
 from backend.features import extract_all_features
-from backend.utils import save_uploaded_file, clear_session_files, get_upload_path
+from backend.utils import (save_uploaded_file, clear_session_files, get_upload_path,
+                           get_cached_analysis, store_cached_analysis, cleanup_old_sessions)
 
 app = Flask(__name__)
 app.secret_key = 'motor_fault_detection_secret_key_2025'
 
+# Use pyFFTW with cached plans for all scipy/librosa FFTs when available
+enable_pyfftw()
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 RESULTS_FOLDER = 'results'
+CACHE_FOLDER = 'cache'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'flac', 'm4a', 'ogg'}
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
 
+# Server-side feature store shared across workers; the cookie session only
+# holds the session id and filenames. Bounded in size, and entries expire
+# after an hour so abandoned sessions do not accumulate.
+feature_store = diskcache.Cache(os.path.join(CACHE_FOLDER, 'sessions'), size_limit=2**30)
+FEATURE_TTL_SECONDS = 3600
+
+# Purge session directories left over from previous runs
+cleanup_old_sessions()
+
 def allowed_file(filename):
     """Check if uploaded file has allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def valid_audio_header(stream):
+    """Check the magic bytes of an upload before writing it to disk."""
+    header = stream.read(12)
+    stream.seek(0)
+    if header.startswith(b'RIFF'):  # WAV
+        return True
+    if header.startswith(b'ID3') or header[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):  # MP3
+        return True
+    if header.startswith(b'fLaC'):  # FLAC
+        return True
+    if header.startswith(b'OggS'):  # OGG
+        return True
+    if header[4:8] == b'ftyp':  # M4A
+        return True
+    return False
+
 @app.route('/')
 def index():
     """Main upload page."""
@@ -47,7 +80,15 @@ def upload_file():
         return redirect(request.url)
     
     if file and allowed_file(file.filename):
+        # Reject renamed non-audio files before they hit the disk
+        if not valid_audio_header(file.stream):
+            return render_template('index.html', error="File does not appear to be a valid audio file.")
+
         try:
+            # Expire old sessions before admitting a new one; registered
+            # sessions come straight off the in-memory heap so this is cheap
+            cleanup_old_sessions()
+
             # Generate unique session ID
             session_id = str(uuid.uuid4())
             session['session_id'] = session_id
@@ -58,6 +99,7 @@ def upload_file():
             # Store both original and saved filenames
             session['original_filename'] = file_info['original_name']
             session['saved_filename'] = file_info['saved_name']
+            session['content_hash'] = file_info['content_hash']
             
             return redirect(url_for('results'))
         except Exception as e:
@@ -83,30 +125,49 @@ def results():
         if not os.path.exists(audio_path):
             return redirect(url_for('index'))
         
-        # Generate spectrograms
-        spectrogram_paths = generate_all_spectrograms(audio_path, session_id)
-        
+        # Check whether this exact audio content was analyzed before
+        content_hash = session.get('content_hash')
+        cached_features = get_cached_analysis(content_hash, session_id) if content_hash else None
+
+        if cached_features is not None:
+            # Cache hit: images are already linked into the results dir
+            features_dict = cached_features
+            spectrogram_paths = {}
+            for spec_type, spec_info in SPECTROGRAM_TYPES.items():
+                filename = f'{spec_type}_spectrogram.png'
+                if os.path.exists(os.path.join('results', session_id, filename)):
+                    spectrogram_paths[spec_type] = {
+                        'path': os.path.join('results', session_id, filename),
+                        'name': spec_info['name'],
+                        'description': spec_info['description']
+                    }
+        else:
+            # Generate spectrograms
+            spectrogram_paths = generate_all_spectrograms(audio_path, session_id)
+
+            # Extract features
+            features_df = extract_all_features(audio_path)
+            features_dict = features_df.to_dict('records')[0]
+
+            # Store the completed analysis for future re-uploads
+            if content_hash:
+                store_cached_analysis(content_hash, session_id, features_dict)
+
         # Convert file paths to web URLs for each spectrogram
         for spec_type in spectrogram_paths:
             if 'path' in spectrogram_paths[spec_type]:
                 # Convert file path to web URL
                 filename_only = os.path.basename(spectrogram_paths[spec_type]['path'])
-                spectrogram_paths[spec_type]['path'] = url_for('serve_result_file', 
-                                                              session_id=session_id, 
+                spectrogram_paths[spec_type]['path'] = url_for('serve_result_file',
+                                                              session_id=session_id,
                                                               filename=filename_only)
-        
-        # Extract features
-        features_df = extract_all_features(audio_path)
-        
-        # Store features in session for download
-        features_dict = features_df.to_dict('records')[0]
         # Add original filename to features
         features_dict['original_filename'] = original_filename
-        session['features'] = features_dict
-        
+        feature_store.set(session_id, features_dict, expire=FEATURE_TTL_SECONDS)
+
         # Convert features to readable format for display
         features_display = {}
-        for key, value in session['features'].items():
+        for key, value in features_dict.items():
             if isinstance(value, float):
                 features_display[key] = round(value, 4)
             else:
@@ -143,13 +204,37 @@ def serve_result_file(session_id, filename):
         app.logger.error(f"Error serving file {filename}: {str(e)}")
         return "Error serving file", 500
 
+@app.route('/audio/<session_id>/<filename>')
+def serve_audio(session_id, filename):
+    """Serve the uploaded audio file for playback."""
+    try:
+        # Security check: ensure session_id matches current session
+        if 'session_id' not in session or session['session_id'] != session_id:
+            return "Unauthorized", 403
+
+        file_path = os.path.join(os.getcwd(), 'uploads', session_id, filename)
+        if not os.path.exists(file_path):
+            app.logger.error(f"File not found: {file_path}")
+            return "File not found", 404
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        # conditional=True lets Werkzeug use the WSGI file wrapper (sendfile)
+        # and honor HTTP Range requests for seeking
+        return send_file(file_path, mimetype=mimetype, conditional=True)
+
+    except Exception as e:
+        app.logger.error(f"Error serving audio {filename}: {str(e)}")
+        return "Error serving file", 500
+
 @app.route('/download/<format>')
 def download_features(format):
     """Download features in CSV or JSON format."""
-    if 'features' not in session:
+    if 'session_id' not in session:
+        return redirect(url_for('index'))
+
+    features = feature_store.get(session['session_id'])
+    if features is None:
         return redirect(url_for('index'))
-    
-    features = session['features']
     original_filename = session.get('original_filename', 'motor_features')
     
     # Create base name for download
@@ -168,10 +253,9 @@ def download_features(format):
                         download_name=f'{base_name}_features.csv')
     
     elif format == 'json':
-        # Create JSON
+        # Create JSON (orjson handles numpy scalars natively)
         output = BytesIO()
-        json_str = json.dumps(features, indent=2)
-        output.write(json_str.encode())
+        output.write(orjson.dumps(features, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         output.seek(0)
         
         return send_file(output,
@@ -186,7 +270,8 @@ def clear_results():
     """Clear all session data and uploaded files."""
     if 'session_id' in session:
         clear_session_files(session['session_id'])
-    
+        feature_store.delete(session['session_id'])
+
     session.clear()
     return redirect(url_for('index'))
 
@@ -211,4 +296,8 @@ def health_check():
     }
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # librosa/numpy release the GIL inside BLAS/FFT kernels, so threads
+    # overlap uploads with analysis. In production run under a threaded
+    # WSGI server instead:
+    #   gunicorn --workers 2 --threads 4 --worker-class gthread app:app
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
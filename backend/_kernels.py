@@ -0,0 +1,63 @@
+"""
+Numba-compiled numeric kernels for feature extraction.
+Provides a one-pass statistical moments kernel; callers fall back to
+scipy when numba is not installed.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def moments(x):
+        """
+        Compute mean, variance, skewness, kurtosis, min, and max of a
+        signal in a single SIMD-vectorized pass.
+
+        Returns:
+            tuple: (mean, variance, skewness, kurtosis, min, max) where
+            variance is the population variance and kurtosis is excess
+            (Fisher) kurtosis.
+        """
+        n = x.size
+        s = 0.0
+        s2 = 0.0
+        s3 = 0.0
+        s4 = 0.0
+        mn = x[0]
+        mx = x[0]
+        for i in range(n):
+            v = x[i]
+            v2 = v * v
+            s += v
+            s2 += v2
+            s3 += v2 * v
+            s4 += v2 * v2
+            if v < mn:
+                mn = v
+            if v > mx:
+                mx = v
+
+        mean = s / n
+        # Central moments from raw moments
+        m2 = s2 / n - mean * mean
+        m3 = s3 / n - 3.0 * mean * s2 / n + 2.0 * mean**3
+        m4 = s4 / n - 4.0 * mean * s3 / n + 6.0 * mean * mean * s2 / n - 3.0 * mean**4
+
+        if m2 > 0.0:
+            skewness = m3 / m2**1.5
+            kurtosis = m4 / (m2 * m2) - 3.0
+        else:
+            skewness = 0.0
+            kurtosis = 0.0
+
+        return mean, m2, skewness, kurtosis, mn, mx
+
+    # Warm up the JIT at import so the first request is not penalized
+    moments(np.zeros(1024, dtype=np.float32))
+else:
+    moments = None
@@ -9,6 +9,9 @@ import pandas as pd
 from scipy import stats
 from sklearn.preprocessing import StandardScaler
 
+from backend.utils import load_audio
+from backend._kernels import moments
+
 def extract_time_domain_features(y, sr):
     """
     Extract time-domain features from audio signal.
@@ -21,53 +24,64 @@ def extract_time_domain_features(y, sr):
         dict: Time-domain features
     """
     features = {}
-    
+
+    # Clips near the validator's 0.1 s floor can undercut 2048 samples at
+    # 8 kHz, so shrink the frame instead of letting framing raise
+    frame_length = min(2048, len(y))
+    hop_length = max(frame_length // 4, 1)
+
     # Basic statistics
-    features['rms'] = float(np.sqrt(np.mean(y**2)))
-    features['energy'] = float(np.sum(y**2))
-    features['zero_crossing_rate'] = float(np.mean(librosa.feature.zero_crossing_rate(y)[0]))
-    
-    # Statistical moments
-    features['mean'] = float(np.mean(y))
-    features['std'] = float(np.std(y))
-    features['skewness'] = float(stats.skew(y))
-    features['kurtosis'] = float(stats.kurtosis(y))
-    
-    # Peak and amplitude features
-    features['max_amplitude'] = float(np.max(np.abs(y)))
-    features['min_amplitude'] = float(np.min(y))
-    features['peak_to_peak'] = float(np.ptp(y))
+    energy = float(np.sum(y**2))
+    features['rms'] = float(np.sqrt(energy / len(y)))
+    features['energy'] = energy
+    features['zero_crossing_rate'] = float(np.mean(
+        librosa.feature.zero_crossing_rate(y, frame_length=frame_length, hop_length=hop_length)[0]))
+
+    # Statistical moments in a single pass over the signal
+    if moments is not None:
+        # Numba-compiled fused kernel
+        mean, variance, skewness, kurtosis, min_val, max_val = moments(y)
+    else:
+        n, (min_val, max_val), mean, variance, skewness, kurtosis = stats.describe(y)
+        variance = variance * (n - 1) / n
+    features['mean'] = float(mean)
+    features['std'] = float(np.sqrt(variance))
+    features['skewness'] = float(skewness)
+    features['kurtosis'] = float(kurtosis)
+
+    # Peak and amplitude features (derived from the min/max above)
+    features['max_amplitude'] = float(max(-min_val, max_val))
+    features['min_amplitude'] = float(min_val)
+    features['peak_to_peak'] = float(max_val - min_val)
     
     # Envelope features
-    envelope = np.abs(librosa.util.frame(y, frame_length=2048, hop_length=512).max(axis=0))
+    envelope = np.abs(librosa.util.frame(y, frame_length=frame_length, hop_length=hop_length).max(axis=0))
     features['envelope_mean'] = float(np.mean(envelope))
     features['envelope_std'] = float(np.std(envelope))
     
     return features
 
-def extract_frequency_domain_features(y, sr):
+def extract_frequency_domain_features(y, sr, S_mag, S_power):
     """
     Extract frequency-domain features from audio signal.
-    
+
     Args:
         y: Audio time series
         sr: Sample rate
-    
+        S_mag: Precomputed STFT magnitude spectrogram
+        S_power: Precomputed STFT power spectrogram
+
     Returns:
         dict: Frequency-domain features
     """
     features = {}
-    
-    # Compute STFT
-    stft = librosa.stft(y)
-    magnitude = np.abs(stft)
-    
-    # Spectral features using librosa
-    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-    spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-    spectral_contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
-    spectral_flatness = librosa.feature.spectral_flatness(y=y)[0]
+
+    # Spectral features using librosa (all derived from the shared STFT)
+    spectral_centroids = librosa.feature.spectral_centroid(S=S_mag, sr=sr)[0]
+    spectral_bandwidth = librosa.feature.spectral_bandwidth(S=S_mag, sr=sr)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S_mag, sr=sr)[0]
+    spectral_contrast = librosa.feature.spectral_contrast(S=S_mag, sr=sr)
+    spectral_flatness = librosa.feature.spectral_flatness(S=S_mag)[0]
     
     features['spectral_centroid_mean'] = float(np.mean(spectral_centroids))
     features['spectral_centroid_std'] = float(np.std(spectral_centroids))
@@ -80,14 +94,20 @@ def extract_frequency_domain_features(y, sr):
     features['spectral_flatness_mean'] = float(np.mean(spectral_flatness))
     features['spectral_flatness_std'] = float(np.std(spectral_flatness))
     
-    # MFCCs
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-    for i in range(13):
-        features[f'mfcc_{i+1}_mean'] = float(np.mean(mfccs[i]))
-        features[f'mfcc_{i+1}_std'] = float(np.std(mfccs[i]))
-    
+    # MFCCs (computed from the shared power spectrogram via mel + DCT).
+    # The DCT runs directly after the mel matrix is built so it stays hot
+    # in cache; explicit dct_type/norm hit librosa's cached DCT basis.
+    mel_spec = librosa.feature.melspectrogram(S=S_power, sr=sr)
+    log_mel = np.ascontiguousarray(librosa.power_to_db(mel_spec))
+    del mel_spec
+    mfccs = librosa.feature.mfcc(S=log_mel, n_mfcc=13, dct_type=2, norm='ortho')
+    mfcc_means = mfccs.mean(axis=1).tolist()
+    mfcc_stds = mfccs.std(axis=1).tolist()
+    features.update({f'mfcc_{i+1}_mean': mfcc_means[i] for i in range(13)})
+    features.update({f'mfcc_{i+1}_std': mfcc_stds[i] for i in range(13)})
+
     # Chroma features
-    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    chroma = librosa.feature.chroma_stft(S=S_power, sr=sr)
     features['chroma_mean'] = float(np.mean(chroma))
     features['chroma_std'] = float(np.std(chroma))
     
@@ -97,7 +117,7 @@ def extract_frequency_domain_features(y, sr):
     features['tonnetz_std'] = float(np.std(tonnetz))
     
     # Fundamental frequency
-    pitches, magnitudes = librosa.piptrack(y=y, sr=sr)
+    pitches, magnitudes = librosa.piptrack(S=S_mag, sr=sr)
     pitch_values = []
     for t in range(pitches.shape[1]):
         index = magnitudes[:, t].argmax()
@@ -114,32 +134,32 @@ def extract_frequency_domain_features(y, sr):
     
     return features
 
-def extract_fault_specific_features(y, sr):
+def extract_fault_specific_features(y, sr, S_mag):
     """
     Extract features specifically relevant to motor fault detection.
-    
+
     Args:
         y: Audio time series
         sr: Sample rate
-    
+        S_mag: Precomputed STFT magnitude spectrogram
+
     Returns:
         dict: Fault-specific features
     """
     features = {}
-    
+
     # Harmonic-to-noise ratio
     harmonic, percussive = librosa.effects.hpss(y)
     harmonic_energy = np.sum(harmonic**2)
     noise_energy = np.sum(percussive**2)
-    
+
     if noise_energy > 0:
         features['harmonic_noise_ratio'] = float(harmonic_energy / noise_energy)
     else:
         features['harmonic_noise_ratio'] = float('inf')
-    
+
     # Spectral irregularity
-    stft = librosa.stft(y)
-    magnitude = np.abs(stft)
+    magnitude = S_mag
     spectral_irregularity = []
     
     for frame in magnitude.T:
@@ -153,7 +173,7 @@ def extract_fault_specific_features(y, sr):
     
     # Low frequency energy ratio (for detecting bearing faults)
     freqs = librosa.fft_frequencies(sr=sr, n_fft=2048)
-    magnitude_spectrum = np.mean(np.abs(librosa.stft(y, n_fft=2048)), axis=1)
+    magnitude_spectrum = np.mean(magnitude, axis=1)
     
     low_freq_mask = freqs <= 1000  # Below 1kHz
     high_freq_mask = freqs > 1000  # Above 1kHz
@@ -165,7 +185,7 @@ def extract_fault_specific_features(y, sr):
     
     # Spectral peaks (for detecting gear faults)
     peaks = []
-    for frame in np.abs(librosa.stft(y)).T:
+    for frame in magnitude.T:
         frame_peaks = []
         for i in range(1, len(frame)-1):
             if frame[i] > frame[i-1] and frame[i] > frame[i+1]:
@@ -188,13 +208,39 @@ def extract_all_features(audio_path):
     Returns:
         pandas.DataFrame: DataFrame with all extracted features
     """
-    # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    
+    # Load audio, pinned to float32 so no extractor silently promotes to
+    # float64 (the STFT below then stays complex64/float32 throughout)
+    y, sr = load_audio(audio_path)
+    y = np.ascontiguousarray(y, dtype=np.float32)
+
+    # Compute the STFT once and share it across all spectral extractors
+    stft = librosa.stft(y, n_fft=2048, hop_length=512)
+    S_mag = np.abs(stft)
+    S_power = S_mag ** 2
+
+    # Time-domain features are band-limited, so compute them on an 8 kHz
+    # downsampled copy; polyphase resampling avoids resampy overhead
+    if sr > 8000:
+        y_lo = librosa.resample(y, orig_sr=sr, target_sr=8000, res_type='polyphase').astype(np.float32, copy=False)
+        sr_lo = 8000
+    else:
+        y_lo, sr_lo = y, sr
+
     # Extract different types of features
-    time_features = extract_time_domain_features(y, sr)
-    freq_features = extract_frequency_domain_features(y, sr)
-    fault_features = extract_fault_specific_features(y, sr)
+    time_features = extract_time_domain_features(y_lo, sr_lo)
+
+    # Energy, RMS and the peak features depend on sample count and on the
+    # transients the anti-alias filter smooths away, so recompute them on
+    # the native-rate signal rather than the 8 kHz copy
+    energy = float(np.sum(y ** 2))
+    time_features['energy'] = energy
+    time_features['rms'] = float(np.sqrt(energy / len(y)))
+    time_features['max_amplitude'] = float(np.max(np.abs(y)))
+    time_features['min_amplitude'] = float(np.min(y))
+    time_features['peak_to_peak'] = float(np.ptp(y))
+
+    freq_features = extract_frequency_domain_features(y, sr, S_mag, S_power)
+    fault_features = extract_fault_specific_features(y, sr, S_mag)
     
     # Combine all features
     all_features = {**time_features, **freq_features, **fault_features}
@@ -0,0 +1,61 @@
+"""
+FFT backend configuration for motor fault detection.
+Registers pyFFTW as the global SciPy FFT backend and as librosa's fftlib
+so plans for the fixed spectrogram shapes (n_fft=2048 etc.) are built
+once and reused.
+"""
+
+import atexit
+import os
+import pickle
+
+WISDOM_FILE = 'fftw_wisdom.dat'
+
+def enable_pyfftw(wisdom_path=WISDOM_FILE):
+    """
+    Register pyFFTW as the SciPy FFT backend and librosa fftlib.
+
+    Loads FFTW wisdom from disk at startup and writes it back on
+    shutdown, so planner output survives restarts. A no-op when pyFFTW
+    is not installed; scipy then falls back to pocketfft and librosa to
+    numpy.fft.
+
+    Args:
+        wisdom_path: Path to the FFTW wisdom cache file
+
+    Returns:
+        bool: True if the pyFFTW backend was enabled
+    """
+    try:
+        import pyfftw
+        import pyfftw.interfaces.numpy_fft
+        import pyfftw.interfaces.scipy_fft
+        import librosa
+        import scipy.fft
+    except ImportError:
+        return False
+
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(600)
+    scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+    # librosa does not go through scipy.fft; it routes transforms through
+    # its own fftlib, which defaults to numpy.fft and must be set directly
+    librosa.set_fftlib(pyfftw.interfaces.numpy_fft)
+
+    # Restore previously accumulated planner wisdom
+    if os.path.exists(wisdom_path):
+        try:
+            with open(wisdom_path, 'rb') as f:
+                pyfftw.import_wisdom(pickle.load(f))
+        except Exception:
+            pass
+
+    def _save_wisdom():
+        try:
+            with open(wisdom_path, 'wb') as f:
+                pickle.dump(pyfftw.export_wisdom(), f)
+        except Exception:
+            pass
+
+    atexit.register(_save_wisdom)
+    return True
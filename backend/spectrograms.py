@@ -8,229 +8,368 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
-import pywt
 from scipy import signal
+import scipy.fft
 import os
+import threading
+from PIL import Image
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def generate_mel_spectrogram(y, sr, save_path):
+from backend.utils import load_audio
+from backend.fft_backend import enable_pyfftw
+
+# The pool workers import this module rather than app, so register the
+# pyFFTW backend here too; repeated calls are harmless
+enable_pyfftw()
+
+# Optional GPU path for the STFT/mel transforms, gated behind USE_GPU=1
+# so CPU-only deployments never import torch
+_use_gpu = False
+if os.environ.get('USE_GPU') == '1':
+    try:
+        import torch
+        import torchaudio
+        _use_gpu = torch.cuda.is_available()
+    except ImportError:
+        _use_gpu = False
+
+@lru_cache(maxsize=4)
+def _gpu_mel_transform(sr):
+    return torchaudio.transforms.MelSpectrogram(
+        sample_rate=sr, n_fft=2048, hop_length=512, n_mels=128, f_max=sr // 2).to('cuda')
+
+@lru_cache(maxsize=4)
+def _gpu_stft_transform():
+    return torchaudio.transforms.Spectrogram(n_fft=2048, hop_length=512, power=1.0).to('cuda')
+
+# One figure reused for every matplotlib render in this process; figure
+# construction and font setup dominate cold plotting time. matplotlib is
+# not thread-safe, so rendering is serialized with a lock.
+_fig_lock = threading.Lock()
+_fig = None
+
+def _acquire_figure():
+    """Make the shared figure current and clear it for the next plot."""
+    global _fig
+    if _fig is None:
+        _fig = plt.figure(figsize=(8, 5))
+    else:
+        plt.figure(_fig.number)
+        _fig.clf()
+    return _fig
+
+def generate_mel_spectrogram(y, sr, save_path, stft_mag=None):
     """
     Generate Mel-Spectrogram for general inspection.
     Good for detecting energy imbalance and tonal shifts.
     """
-    plt.figure(figsize=(12, 8))
-    
-    # Compute mel-spectrogram
-    mel_spec = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128, fmax=sr//2)
+    # Compute mel-spectrogram (on GPU when available)
+    if _use_gpu:
+        x = torch.from_numpy(np.ascontiguousarray(y)).to('cuda')
+        mel_spec = _gpu_mel_transform(sr)(x).cpu().numpy()
+    else:
+        if stft_mag is None:
+            stft_mag = np.abs(librosa.stft(y, n_fft=2048, hop_length=512))
+        mel_spec = _mel_fb(sr, 2048, 128, sr//2) @ (stft_mag ** 2)
     mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
-    
+
     # Plot
-    librosa.display.specshow(mel_spec_db, sr=sr, x_axis='time', y_axis='mel', fmax=sr//2)
-    plt.colorbar(format='%+2.0f dB')
-    plt.title('Mel-Spectrogram\n(Energy imbalance, tonal shifts, soft degradation patterns)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('Mel Frequency')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    with _fig_lock:
+        _acquire_figure()
+        librosa.display.specshow(mel_spec_db, sr=sr, x_axis='time', y_axis='mel', fmax=sr//2)
+        plt.colorbar(format='%+2.0f dB')
+        plt.title('Mel-Spectrogram\n(Energy imbalance, tonal shifts, soft degradation patterns)', fontsize=14)
+        plt.xlabel('Time (s)')
+        plt.ylabel('Mel Frequency')
+        plt.tight_layout()
+        plt.savefig(save_path, dpi=80, pil_kwargs={'compress_level': 1})
 
 def generate_cqt_spectrogram(y, sr, save_path):
     """
     Generate Constant-Q Transform spectrogram.
     Good for detecting harmonic noise and frequency content shifts in warmcut.
     """
-    plt.figure(figsize=(12, 8))
-    
     # Compute CQT
     cqt = librosa.cqt(y, sr=sr, hop_length=512, n_bins=84)
     cqt_db = librosa.amplitude_to_db(np.abs(cqt), ref=np.max)
-    
+
     # Plot
-    librosa.display.specshow(cqt_db, sr=sr, x_axis='time', y_axis='cqt_note')
-    plt.colorbar(format='%+2.0f dB')
-    plt.title('Constant-Q Transform (CQT)\n(Harmonic noise, shifted frequency content)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('CQT Frequency')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    with _fig_lock:
+        _acquire_figure()
+        librosa.display.specshow(cqt_db, sr=sr, x_axis='time', y_axis='cqt_note')
+        plt.colorbar(format='%+2.0f dB')
+        plt.title('Constant-Q Transform (CQT)\n(Harmonic noise, shifted frequency content)', fontsize=14)
+        plt.xlabel('Time (s)')
+        plt.ylabel('CQT Frequency')
+        plt.tight_layout()
+        plt.savefig(save_path, dpi=80, pil_kwargs={'compress_level': 1})
 
-def generate_log_stft_spectrogram(y, sr, save_path):
+def generate_log_stft_spectrogram(y, sr, save_path, stft_mag=None):
     """
     Generate Log-STFT spectrogram.
     Good for detecting low-frequency rumble from imbalance or looseness.
     """
-    plt.figure(figsize=(12, 8))
-    
-    # Compute STFT
-    stft = librosa.stft(y, hop_length=512, n_fft=2048)
-    stft_db = librosa.amplitude_to_db(np.abs(stft), ref=np.max)
-    
+    # Compute STFT (on GPU when available)
+    if _use_gpu:
+        x = torch.from_numpy(np.ascontiguousarray(y)).to('cuda')
+        stft_mag = _gpu_stft_transform()(x).cpu().numpy()
+    elif stft_mag is None:
+        stft_mag = np.abs(librosa.stft(y, hop_length=512, n_fft=2048))
+    stft_db = librosa.amplitude_to_db(stft_mag, ref=np.max)
+
     # Plot with log frequency scale
-    librosa.display.specshow(stft_db, sr=sr, x_axis='time', y_axis='log')
-    plt.colorbar(format='%+2.0f dB')
-    plt.title('Log-STFT Spectrogram\n(Low-frequency rumble, imbalance, looseness)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('Log Frequency (Hz)')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    with _fig_lock:
+        _acquire_figure()
+        librosa.display.specshow(stft_db, sr=sr, x_axis='time', y_axis='log')
+        plt.colorbar(format='%+2.0f dB')
+        plt.title('Log-STFT Spectrogram\n(Low-frequency rumble, imbalance, looseness)', fontsize=14)
+        plt.xlabel('Time (s)')
+        plt.ylabel('Log Frequency (Hz)')
+        plt.tight_layout()
+        plt.savefig(save_path, dpi=80, pil_kwargs={'compress_level': 1})
+
+@lru_cache(maxsize=4)
+def _colormap_lut(cmap_name):
+    """256-entry RGB lookup table for a matplotlib colormap."""
+    return (matplotlib.colormaps[cmap_name](np.linspace(0, 1, 256))[:, :3] * 255).astype(np.uint8)
+
+def _save_array_image(arr, save_path, cmap_name, size=(800, 500)):
+    """
+    Render a 2-D array straight to PNG via a colormap LUT and Pillow.
+
+    Skips the matplotlib Agg pipeline entirely: min-max scale to uint8,
+    index the colormap LUT, resize to display resolution, and encode with
+    a fast compression level. Rows are drawn top-down as given, so
+    callers orient the array before passing it in.
+    """
+    vmin = float(arr.min())
+    vmax = float(arr.max())
+    if vmax > vmin:
+        scaled = ((arr - vmin) * (255.0 / (vmax - vmin))).astype(np.uint8)
+    else:
+        scaled = np.zeros(arr.shape, dtype=np.uint8)
+    rgb = _colormap_lut(cmap_name)[scaled]
+    Image.fromarray(rgb).resize(size, Image.BILINEAR).save(save_path, format='PNG', compress_level=1)
+
+@lru_cache(maxsize=16)
+def _mel_fb(sr, n_fft, n_mels, fmax):
+    """Mel filter bank cached across requests with identical parameters."""
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmax=fmax).astype(np.float32)
+
+@lru_cache(maxsize=16)
+def _tukey_window(n):
+    """Tukey window (scipy.signal.spectrogram's default) cached by length."""
+    return signal.windows.tukey(n, 0.25).astype(np.float32)
+
+@lru_cache(maxsize=8)
+def _morlet_bank_fd(n):
+    """
+    Frequency-domain Morlet filter bank for the fixed 1..127 scale ladder.
+
+    The bank is multiplied against the signal's rFFT so the whole CWT
+    becomes one forward FFT, one broadcast multiply, and a batched
+    inverse FFT instead of 127 time-domain convolutions.
+    """
+    scales = np.arange(1, 128)
+    omega = 2 * np.pi * np.fft.rfftfreq(n)
+    w = scales[:, None] * omega[None, :]
+    # Morlet with w0=5 (pywt's 'morl'), L2-normalized per scale
+    bank = np.pi ** -0.25 * np.exp(-0.5 * (w - 5.0) ** 2) * np.sqrt(scales)[:, None]
+    return bank.astype(np.complex64)
 
 def generate_wavelet_scalogram(y, sr, save_path):
     """
     Generate Wavelet Scalogram.
     Good for detecting short bursts and transient spikes from loose components.
     """
-    plt.figure(figsize=(12, 8))
-    
-    # Downsample for computational efficiency
+    # Downsample to a fixed length for computational efficiency; every
+    # upload then hits the same cached Morlet bank below
     if len(y) > 50000:
-        y_resampled = signal.resample(y, 50000)
+        y_resampled = signal.resample(y, 50000).astype(np.float32)
     else:
         y_resampled = y
-    
-    # Compute continuous wavelet transform
-    scales = np.arange(1, 128)
-    coefficients, frequencies = pywt.cwt(y_resampled, scales, 'morl', sampling_period=1/sr)
-    
-    # Plot scalogram
-    plt.imshow(np.abs(coefficients), extent=[0, len(y_resampled)/sr, frequencies[-1], frequencies[0]], 
-               cmap='hot', aspect='auto', interpolation='bilinear')
-    plt.colorbar(label='Magnitude')
-    plt.title('Wavelet Scalogram\n(Short bursts, transient spikes from loose components)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('Frequency (Hz)')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
-
-def generate_spectral_kurtosis(y, sr, save_path):
+
+    # Compute continuous wavelet transform in the frequency domain:
+    # one rFFT of the signal, then a batched inverse rFFT per scale
+    n = len(y_resampled)
+    spectrum = scipy.fft.rfft(y_resampled)
+    coefficients = scipy.fft.irfft(spectrum[None, :] * _morlet_bank_fd(n), n=n, axis=1, workers=-1)
+
+    # Render scalogram directly (high frequencies / small scales on top)
+    _save_array_image(np.abs(coefficients, out=coefficients), save_path, 'hot')
+
+def generate_spectral_kurtosis(y, sr, save_path, stft_mag=None):
     """
     Generate Spectral Kurtosis plot.
     Good for detecting impulses and sudden power shifts.
     """
-    plt.figure(figsize=(12, 8))
-    
-    # Compute STFT
-    f, t, stft = signal.spectrogram(y, sr, nperseg=2048, noverlap=1024)
-    
-    # Compute spectral kurtosis
-    stft_magnitude = np.abs(stft)
-    spectral_kurtosis = np.zeros_like(stft_magnitude)
-    
-    for i in range(stft_magnitude.shape[0]):
-        freq_data = stft_magnitude[i, :]
-        if np.std(freq_data) > 0:
-            # Kurtosis calculation
-            mean_val = np.mean(freq_data)
-            std_val = np.std(freq_data)
-            kurtosis_val = np.mean(((freq_data - mean_val) / std_val) ** 4) - 3
-            spectral_kurtosis[i, :] = kurtosis_val
-    
-    # Plot
-    plt.imshow(spectral_kurtosis, extent=[t[0], t[-1], f[0], f[-1]], 
-               cmap='viridis', aspect='auto', origin='lower')
-    plt.colorbar(label='Kurtosis')
-    plt.title('Spectral Kurtosis\n(Impulses and sudden power shifts)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('Frequency (Hz)')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    # Compute STFT with the cached window, or reuse the shared magnitude
+    if stft_mag is None:
+        _, _, stft = signal.spectrogram(y, sr, window=_tukey_window(2048), noverlap=1024)
+        stft_magnitude = np.abs(stft)
+    else:
+        stft_magnitude = stft_mag
+
+    # Compute spectral kurtosis for all frequency bins in one vectorized pass
+    mean_vals = stft_magnitude.mean(axis=1, keepdims=True)
+    std_vals = stft_magnitude.std(axis=1, keepdims=True)
+
+    kurtosis_vals = np.zeros(stft_magnitude.shape[0])
+    valid = std_vals[:, 0] > 0
+    if np.any(valid):
+        z = (stft_magnitude[valid] - mean_vals[valid]) / std_vals[valid]
+        kurtosis_vals[valid] = np.mean(z ** 4, axis=1) - 3
+
+    # Each bin's kurtosis is constant across time, as in the original plot
+    spectral_kurtosis = np.broadcast_to(kurtosis_vals[:, None], stft_magnitude.shape)
+
+    # Render directly, flipped so low frequencies sit at the bottom
+    _save_array_image(spectral_kurtosis[::-1], save_path, 'viridis')
 
 def generate_modulation_spectrogram(y, sr, save_path):
     """
     Generate Modulation Spectrogram.
     Good for detecting wobble or sideband-type modulation from winding faults.
     """
-    plt.figure(figsize=(12, 8))
-    
     # Compute envelope using Hilbert transform
     analytic_signal = signal.hilbert(y)
     envelope = np.abs(analytic_signal)
-    
+
     # Compute spectrogram of the envelope
-    f, t, envelope_spec = signal.spectrogram(envelope, sr, nperseg=2048, noverlap=1024)
-    
-    # Convert to dB
-    envelope_spec_db = 10 * np.log10(envelope_spec + 1e-10)
-    
-    # Plot
-    plt.imshow(envelope_spec_db, extent=[t[0], t[-1], f[0], f[-1]], 
-               cmap='plasma', aspect='auto', origin='lower')
-    plt.colorbar(label='Power (dB)')
-    plt.title('Modulation Spectrogram\n(Wobble or sideband-type modulation from winding faults)', fontsize=14)
-    plt.xlabel('Time (s)')
-    plt.ylabel('Modulation Frequency (Hz)')
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    _, _, envelope_spec = signal.spectrogram(envelope, sr, window=_tukey_window(2048), noverlap=1024)
+
+    # Convert to dB in place; the display min-max scales afterwards, so
+    # no copy of the matrix is needed (float32 constants avoid promotion)
+    np.add(envelope_spec, np.float32(1e-10), out=envelope_spec)
+    np.log10(envelope_spec, out=envelope_spec)
+    np.multiply(envelope_spec, np.float32(10.0), out=envelope_spec)
+
+    # Render directly, flipped so low modulation frequencies sit at the bottom
+    _save_array_image(envelope_spec[::-1], save_path, 'plasma')
+
+# Spectrogram types and their generator functions
+SPECTROGRAM_TYPES = {
+    'mel': {
+        'name': 'Mel-Spectrogram',
+        'description': 'Energy imbalance, tonal shifts, soft degradation patterns',
+        'function': generate_mel_spectrogram,
+        'uses_stft': True
+    },
+    'cqt': {
+        'name': 'Constant-Q Transform (CQT)',
+        'description': 'Harmonic noise, shifted frequency content',
+        'function': generate_cqt_spectrogram
+    },
+    'log_stft': {
+        'name': 'Log-STFT',
+        'description': 'Low-frequency rumble, imbalance, looseness',
+        'function': generate_log_stft_spectrogram,
+        'uses_stft': True
+    },
+    'wavelet': {
+        'name': 'Wavelet Scalogram',
+        'description': 'Short bursts, transient spikes from loose components',
+        'function': generate_wavelet_scalogram
+    },
+    'spectral_kurtosis': {
+        'name': 'Spectral Kurtosis',
+        'description': 'Impulses and sudden power shifts',
+        'function': generate_spectral_kurtosis,
+        'uses_stft': True
+    },
+    'modulation': {
+        'name': 'Modulation Spectrogram',
+        'description': 'Wobble or sideband-type modulation from winding faults',
+        'function': generate_modulation_spectrogram
+    }
+}
+
+# Process pool shared across requests; the six spectrograms are independent
+# and CPU-bound, so they parallelize across cores. Created lazily (an
+# eager pool at import would respawn inside every pool worker, which also
+# imports this module) and under a lock so concurrent first requests
+# cannot each construct one.
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=min(6, os.cpu_count() or 1))
+    return _executor
+
+def _generate_one(spec_type, audio_npy_path, stft_npy_path, sr, save_path):
+    """
+    Worker entry point: generate a single spectrogram in a child process.
+
+    The audio and the shared STFT magnitude are passed as .npy file paths
+    instead of pickling the arrays through the process pipe.
+    """
+    y = np.load(audio_npy_path)
+    spec_info = SPECTROGRAM_TYPES[spec_type]
+    if spec_info.get('uses_stft') and os.path.exists(stft_npy_path):
+        spec_info['function'](y, sr, save_path, stft_mag=np.load(stft_npy_path))
+    else:
+        spec_info['function'](y, sr, save_path)
 
 def generate_all_spectrograms(audio_path, session_id):
     """
     Generate all six types of spectrograms for the given audio file.
-    
+    The six generators run in parallel across a process pool.
+
     Args:
         audio_path: Path to the audio file
         session_id: Unique session identifier
-    
+
     Returns:
         dict: Dictionary containing paths to generated spectrogram images
     """
-    # Load audio
-    y, sr = librosa.load(audio_path, sr=None)
-    
+    # Load audio pinned to float32 so every transform stays in
+    # float32/complex64 (librosa and scipy preserve single precision)
+    y, sr = load_audio(audio_path)
+    y = np.ascontiguousarray(y, dtype=np.float32)
+
     # Create results directory for this session
     results_dir = os.path.join('results', session_id)
     os.makedirs(results_dir, exist_ok=True)
-    
-    # Define spectrogram types and their generator functions
-    spectrograms = {
-        'mel': {
-            'name': 'Mel-Spectrogram',
-            'description': 'Energy imbalance, tonal shifts, soft degradation patterns',
-            'function': generate_mel_spectrogram
-        },
-        'cqt': {
-            'name': 'Constant-Q Transform (CQT)',
-            'description': 'Harmonic noise, shifted frequency content',
-            'function': generate_cqt_spectrogram
-        },
-        'log_stft': {
-            'name': 'Log-STFT',
-            'description': 'Low-frequency rumble, imbalance, looseness',
-            'function': generate_log_stft_spectrogram
-        },
-        'wavelet': {
-            'name': 'Wavelet Scalogram',
-            'description': 'Short bursts, transient spikes from loose components',
-            'function': generate_wavelet_scalogram
-        },
-        'spectral_kurtosis': {
-            'name': 'Spectral Kurtosis',
-            'description': 'Impulses and sudden power shifts',
-            'function': generate_spectral_kurtosis
-        },
-        'modulation': {
-            'name': 'Modulation Spectrogram',
-            'description': 'Wobble or sideband-type modulation from winding faults',
-            'function': generate_modulation_spectrogram
-        }
-    }
-    
-    # Generate each spectrogram
+
+    # Share the audio with worker processes via a temp .npy file
+    audio_npy_path = os.path.join(results_dir, 'audio.npy')
+    np.save(audio_npy_path, y)
+
+    # Compute the STFT magnitude once; mel, log-STFT, and kurtosis reuse it
+    stft_npy_path = os.path.join(results_dir, 'stft.npy')
+    np.save(stft_npy_path, np.abs(librosa.stft(y, n_fft=2048, hop_length=512)))
+
+    # Dispatch each spectrogram to the pool and collect as they finish
     spectrogram_paths = {}
-    for spec_type, spec_info in spectrograms.items():
-        save_path = os.path.join(results_dir, f'{spec_type}_spectrogram.png')
-        try:
-            spec_info['function'](y, sr, save_path)
-            spectrogram_paths[spec_type] = {
-                'path': save_path,
-                'name': spec_info['name'],
-                'description': spec_info['description']
-            }
-        except Exception as e:
-            print(f"Error generating {spec_type} spectrogram: {str(e)}")
-            # Create a placeholder or skip this spectrogram
-            continue
-    
+    try:
+        executor = _get_executor()
+        futures = {}
+        for spec_type, spec_info in SPECTROGRAM_TYPES.items():
+            save_path = os.path.join(results_dir, f'{spec_type}_spectrogram.png')
+            future = executor.submit(_generate_one, spec_type, audio_npy_path, stft_npy_path, sr, save_path)
+            futures[future] = (spec_type, save_path)
+
+        for future in as_completed(futures):
+            spec_type, save_path = futures[future]
+            try:
+                future.result()
+                spectrogram_paths[spec_type] = {
+                    'path': save_path,
+                    'name': SPECTROGRAM_TYPES[spec_type]['name'],
+                    'description': SPECTROGRAM_TYPES[spec_type]['description']
+                }
+            except Exception as e:
+                print(f"Error generating {spec_type} spectrogram: {str(e)}")
+                # Create a placeholder or skip this spectrogram
+                continue
+    finally:
+        for temp_path in (audio_npy_path, stft_npy_path):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
     return spectrogram_paths
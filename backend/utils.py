@@ -3,10 +3,76 @@ Utility functions for file handling, cleanup, and helper operations.
 """
 
 import os
+import heapq
+import json
 import shutil
+import time
 import uuid
+import xxhash
 from werkzeug.utils import secure_filename
 
+# In-memory index of live sessions so cleanup does not have to stat every
+# session directory on each run; the heap is ordered by expiry time
+_session_registry = {}
+_expiry_heap = []
+
+# Completed analyses cached by upload content hash, so re-uploading the
+# same file skips the whole pipeline. Bounded like the feature store in
+# app.py: entries age out with sessions and total size is capped, with
+# the least recently used analyses evicted first
+ANALYSIS_CACHE_DIR = os.path.join('cache', 'analysis')
+ANALYSIS_CACHE_MAX_BYTES = 2**30
+
+# Analysis window cap: longer uploads are truncated at decode time so no
+# downstream transform ever sees more than this many seconds
+MAX_ANALYSIS_DURATION = 20.0
+
+def load_audio(file_path, target_sr=None, max_duration=MAX_ANALYSIS_DURATION):
+    """
+    Load an audio file quickly via soundfile, falling back to librosa.
+
+    soundfile decodes WAV/FLAC/OGG directly without going through
+    audioread/ffmpeg, which librosa.load does for non-WAV formats.
+    MP3/M4A files that soundfile cannot open fall back to librosa.
+    Decoding stops after max_duration seconds so long uploads do not
+    inflate every downstream transform.
+
+    Args:
+        file_path: Path to the audio file
+        target_sr: Optional sample rate to resample to (None keeps native rate)
+        max_duration: Maximum seconds to decode (None decodes everything)
+
+    Returns:
+        tuple: (audio time series as float32, sample rate)
+    """
+    import numpy as np
+
+    try:
+        import soundfile as sf
+
+        # Single open: read the header and the capped sample range from
+        # the same handle, never materializing more than the cap
+        with sf.SoundFile(file_path) as f:
+            sr = f.samplerate
+            frames = int(max_duration * sr) if max_duration is not None else -1
+            y = f.read(frames=frames, dtype='float32', always_2d=False)
+        if y.ndim == 2:
+            y = y.mean(axis=1)
+    except Exception:
+        # soundfile cannot decode this format (e.g. MP3/M4A) - use librosa
+        import librosa
+        y, sr = librosa.load(file_path, sr=None, duration=max_duration)
+
+    if target_sr is not None and sr != target_sr:
+        from math import gcd
+        from scipy.signal import resample_poly
+
+        g = gcd(int(sr), int(target_sr))
+        y = resample_poly(y, target_sr // g, sr // g).astype(np.float32)
+        sr = target_sr
+
+    return y, sr
+
 def save_uploaded_file(file, session_id):
     """
     Save uploaded file with a unique name but return both original and saved names.
@@ -18,9 +84,10 @@ def save_uploaded_file(file, session_id):
     Returns:
         dict: Contains original_name, saved_name, and file_path
     """
-    # Create session directory
+    # Create session directory and register it for cleanup tracking
     session_dir = os.path.join('uploads', session_id)
     os.makedirs(session_dir, exist_ok=True)
+    _register_session(session_id)
     
     # Get original filename
     original_filename = secure_filename(file.filename)
@@ -28,17 +95,86 @@ def save_uploaded_file(file, session_id):
     # Generate unique filename for storage (keep UUID for uniqueness)
     file_extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
     unique_filename = f"{uuid.uuid4().hex}.{file_extension}"
-    
-    # Save file
+
+    # Save file, hashing the content in the same streaming pass
     file_path = os.path.join(session_dir, unique_filename)
-    file.save(file_path)
-    
+    hasher = xxhash.xxh3_64()
+    with open(file_path, 'wb') as dst:
+        chunk = file.stream.read(1 << 20)
+        while chunk:
+            hasher.update(chunk)
+            dst.write(chunk)
+            chunk = file.stream.read(1 << 20)
+
     return {
         'original_name': original_filename,
         'saved_name': unique_filename,
-        'file_path': file_path
+        'file_path': file_path,
+        'content_hash': hasher.hexdigest()
     }
 
+def get_cached_analysis(content_hash, session_id):
+    """
+    Look up a previous analysis of the same audio content.
+
+    On a hit, the cached spectrogram images are hard-linked (or copied)
+    into the session's results directory so the normal serving paths work
+    unchanged.
+
+    Args:
+        content_hash: xxh3 hex digest of the uploaded bytes
+        session_id: Session to populate with the cached images
+
+    Returns:
+        dict or None: The cached features dict, or None on a miss
+    """
+    cache_dir = os.path.join(ANALYSIS_CACHE_DIR, content_hash)
+    features_path = os.path.join(cache_dir, 'features.json')
+    if not os.path.exists(features_path):
+        return None
+
+    # Refresh the entry's mtime so eviction approximates LRU order
+    os.utime(cache_dir)
+
+    results_dir = os.path.join('results', session_id)
+    os.makedirs(results_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.endswith('.png'):
+            dst = os.path.join(results_dir, name)
+            if not os.path.exists(dst):
+                try:
+                    os.link(os.path.join(cache_dir, name), dst)
+                except OSError:
+                    shutil.copy(os.path.join(cache_dir, name), dst)
+
+    with open(features_path) as f:
+        return json.load(f)
+
+def store_cached_analysis(content_hash, session_id, features):
+    """
+    Store a completed analysis under its content hash for reuse.
+
+    Args:
+        content_hash: xxh3 hex digest of the uploaded bytes
+        session_id: Session whose results directory holds the images
+        features: Extracted features dict
+    """
+    cache_dir = os.path.join(ANALYSIS_CACHE_DIR, content_hash)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    results_dir = os.path.join('results', session_id)
+    for name in os.listdir(results_dir):
+        if name.endswith('.png'):
+            dst = os.path.join(cache_dir, name)
+            if not os.path.exists(dst):
+                try:
+                    os.link(os.path.join(results_dir, name), dst)
+                except OSError:
+                    shutil.copy(os.path.join(results_dir, name), dst)
+
+    with open(os.path.join(cache_dir, 'features.json'), 'w') as f:
+        json.dump(features, f)
+
 def get_upload_path(saved_filename, session_id):
     """
     Get the full path to an uploaded file using saved filename.
@@ -77,96 +213,154 @@ def ensure_directories():
     for directory in directories:
         os.makedirs(directory, exist_ok=True)
 
+def _register_session(session_id, max_age_hours=24):
+    """
+    Track a session in the in-memory expiry index.
+
+    Args:
+        session_id: Session identifier to track
+        max_age_hours: Hours until the session is eligible for cleanup
+    """
+    now = time.time()
+    _session_registry[session_id] = now
+    heapq.heappush(_expiry_heap, (now + max_age_hours * 3600, session_id))
+
 def cleanup_old_sessions(max_age_hours=24):
     """
     Clean up old session files older than specified age.
-    
+
+    Registered sessions are expired straight off the in-memory heap
+    without any stat calls; a directory scan only runs for session
+    directories left behind by previous processes. The content-hash
+    analysis cache is pruned on the same schedule.
+
     Args:
         max_age_hours: Maximum age in hours before cleanup
     """
-    import time
-    
     current_time = time.time()
     max_age_seconds = max_age_hours * 3600
-    
-    # Clean uploads
-    uploads_dir = 'uploads'
-    if os.path.exists(uploads_dir):
-        for session_dir in os.listdir(uploads_dir):
-            session_path = os.path.join(uploads_dir, session_dir)
-            if os.path.isdir(session_path):
-                dir_age = current_time - os.path.getctime(session_path)
-                if dir_age > max_age_seconds:
-                    shutil.rmtree(session_path)
-    
-    # Clean results
-    results_dir = 'results'
-    if os.path.exists(results_dir):
-        for session_dir in os.listdir(results_dir):
-            session_path = os.path.join(results_dir, session_dir)
-            if os.path.isdir(session_path):
-                dir_age = current_time - os.path.getctime(session_path)
-                if dir_age > max_age_seconds:
-                    shutil.rmtree(session_path)
+
+    # Expire registered sessions in O(log n) per eviction
+    while _expiry_heap and _expiry_heap[0][0] <= current_time:
+        _, session_id = heapq.heappop(_expiry_heap)
+        if session_id in _session_registry:
+            del _session_registry[session_id]
+            clear_session_files(session_id)
+
+    # Fall back to scanning for directories this process never registered
+    for base_dir in ('uploads', 'results'):
+        if os.path.exists(base_dir):
+            for session_dir in os.listdir(base_dir):
+                if session_dir in _session_registry:
+                    continue
+                session_path = os.path.join(base_dir, session_dir)
+                if os.path.isdir(session_path):
+                    dir_age = current_time - os.path.getctime(session_path)
+                    if dir_age > max_age_seconds:
+                        shutil.rmtree(session_path)
+
+    _prune_analysis_cache(current_time, max_age_seconds)
+
+def _prune_analysis_cache(current_time, max_age_seconds, max_bytes=ANALYSIS_CACHE_MAX_BYTES):
+    """
+    Expire and bound the content-hash analysis cache.
+
+    Entries older than max_age_seconds are removed, then the oldest
+    surviving entries (by last use, see get_cached_analysis) are evicted
+    until the cache fits under max_bytes.
+
+    Args:
+        current_time: Current time.time() value
+        max_age_seconds: Maximum entry age before eviction
+        max_bytes: Total size cap for the cache directory
+    """
+    if not os.path.exists(ANALYSIS_CACHE_DIR):
+        return
+
+    entries = []
+    for name in os.listdir(ANALYSIS_CACHE_DIR):
+        entry_path = os.path.join(ANALYSIS_CACHE_DIR, name)
+        if not os.path.isdir(entry_path):
+            continue
+        size = sum(os.path.getsize(os.path.join(entry_path, f))
+                   for f in os.listdir(entry_path))
+        entries.append((os.path.getmtime(entry_path), size, entry_path))
+
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    for mtime, size, entry_path in entries:
+        if current_time - mtime > max_age_seconds or total_size > max_bytes:
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total_size -= size
 
 def get_file_info(file_path):
     """
-    Get information about an audio file.
-    
+    Get information about an audio file from its header.
+
     Args:
         file_path: Path to the audio file
-    
+
     Returns:
         dict: File information
     """
+    try:
+        import soundfile as sf
+
+        # Header-only parse, no decoding
+        info = sf.info(file_path)
+        return {
+            'duration': info.duration,
+            'sample_rate': info.samplerate,
+            'n_samples': info.frames,
+            'file_size': os.path.getsize(file_path),
+            'channels': info.channels
+        }
+    except Exception:
+        pass
+
+    # Fall back to decoding for formats soundfile cannot parse (MP3/M4A)
     import librosa
-    
+
     try:
-        # Load audio to get info
         y, sr = librosa.load(file_path, sr=None)
-        
-        info = {
+
+        return {
             'duration': len(y) / sr,
             'sample_rate': sr,
             'n_samples': len(y),
             'file_size': os.path.getsize(file_path),
             'channels': 1 if y.ndim == 1 else y.shape[0]
         }
-        
-        return info
-    
+
     except Exception as e:
         return {'error': str(e)}
 
 def validate_audio_file(file_path):
     """
     Validate that the uploaded file is a valid audio file.
-    
+    Checks the header only; the file is never fully decoded.
+
     Args:
         file_path: Path to the audio file
-    
+
     Returns:
         tuple: (is_valid, error_message)
     """
-    try:
-        import librosa
-        
-        # Try to load the file
-        y, sr = librosa.load(file_path, sr=None)
-        
-        # Check if file contains data
-        if len(y) == 0:
-            return False, "Audio file contains no data"
-        
-        # Check duration (minimum 0.1 seconds)
-        if len(y) / sr < 0.1:
-            return False, "Audio file is too short (minimum 0.1 seconds)"
-        
-        # Check sample rate
-        if sr < 1000:
-            return False, "Sample rate is too low"
-        
-        return True, "Valid audio file"
-    
-    except Exception as e:
-        return False, f"Invalid audio file: {str(e)}"
+    info = get_file_info(file_path)
+
+    if 'error' in info:
+        return False, f"Invalid audio file: {info['error']}"
+
+    # Check if file contains data
+    if info['n_samples'] == 0:
+        return False, "Audio file contains no data"
+
+    # Check duration (minimum 0.1 seconds)
+    if info['duration'] < 0.1:
+        return False, "Audio file is too short (minimum 0.1 seconds)"
+
+    # Check sample rate
+    if info['sample_rate'] < 1000:
+        return False, "Sample rate is too low"
+
+    return True, "Valid audio file"